@@ -5,8 +5,13 @@ class Config:
         self.output_dir = os.getenv("DOWNLOAD_DIR", "./downloads")
         self.max_image_workers = int(os.getenv("MAX_IMAGE_WORKERS", 5))
         self.max_chapter_workers = int(os.getenv("MAX_CHAPTER_WORKERS", 2))
+        self.job_batch_size = int(os.getenv("JOB_BATCH_SIZE", 16))
         self.retry_count = int(os.getenv("RETRY_COUNT", 3))
         self.retry_base_delay = float(os.getenv("RETRY_DELAY", 2))
+        self.redis_url = os.getenv("REDIS_URL", "redis://redis:6379/0")
+        self.redis_pool_size = int(os.getenv("REDIS_POOL_SIZE", 50))
+
+_config_singleton = Config()
 
 def get_config():
-    return Config()
+    return _config_singleton
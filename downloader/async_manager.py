@@ -1,124 +1,352 @@
-import os, asyncio, httpx, random
+import os, asyncio, httpx, aiofiles, aiofiles.os
+from concurrent.futures import ProcessPoolExecutor
+from collections import defaultdict
 from pathlib import Path
 import redis.asyncio as aioredis
+from redis.exceptions import NoScriptError, ResponseError
 from rich.console import Console
 from constants import HEADERS, DEFAULT_REQUEST_TIMEOUT
 from config import get_config
+from redis_pool import pool
 from sources import find_source_for_url
 from PIL import Image
 
 console = Console()
 
+STATS_DECAY_THRESHOLD = 200
+STATS_FLUSH_INTERVAL = 1.0
+# Safety net for slot waiters if a keyspace notification is missed (or notifications are off).
+SLOT_WAIT_TIMEOUT = 5
+# Keyspace events (K) for string ($) and generic (g, e.g. DEL/EXPIRE) commands on dl_active:*.
+KEYSPACE_FLAGS = "K$g"  # "A" in an existing config already covers $ and g
+DOWNLOAD_CHUNK_SIZE = 1 << 16
+# Connection pool size; image streams are gated to this many in flight (see download_chapter).
+HTTP_MAX_CONNECTIONS = 100
+# JPEGs at or below this size are kept as downloaded when COMPRESS_IMAGES is on.
+RECOMPRESS_MIN_BYTES = 200_000
+JPEG_EXTS = (".jpg", ".jpeg")
+# Resume ETags of a chapter left with .part files expire if it is never retried.
+ETAG_TTL = 30 * 24 * 3600
+
+# Atomically take a download slot: INCR dl_active only while it is below the limit
+# stored in the dl_stats:{source} hash.
+ACQUIRE_LUA = (
+    "local lim=tonumber(redis.call('HGET',KEYS[1],'limit') or ARGV[1]); "
+    "local a=tonumber(redis.call('GET',KEYS[2]) or 0); "
+    "if a<lim then redis.call('INCR',KEYS[2]); return 1 else return 0 end"
+)
+
+# Add a batch of results to the dl_stats:{source} hash and halve both counters once they
+# pass the threshold, in one server-side step. Returns {success, error, limit}.
+DECAY_LUA = (
+    "local s=redis.call('HINCRBY',KEYS[1],'success',ARGV[1]); "
+    "local e=redis.call('HINCRBY',KEYS[1],'error',ARGV[2]); "
+    "if s+e>tonumber(ARGV[3]) then s=math.floor(s/2); e=math.floor(e/2); "
+    "redis.call('HSET',KEYS[1],'success',s,'error',e) end; "
+    "redis.call('SADD',KEYS[2],ARGV[4]); "
+    "return {s,e,redis.call('HGET',KEYS[1],'limit')}"
+)
+
+SCRIPTS = {"acquire": ACQUIRE_LUA, "decay": DECAY_LUA}
+
+def _recompress(path):
+    """Re-encode an image as JPEG in place. Runs in a worker process (CPU-bound)."""
+    img = Image.open(path).convert("RGB")
+    img.save(path, "JPEG", quality=85, optimize=True, progressive=True, subsampling=2)
+
+
 class AsyncDownloadManager:
     def __init__(self, config=None):
         self.config = config or get_config()
         self.output_dir = Path(self.config.output_dir)
         self.output_dir.mkdir(parents=True, exist_ok=True)
+        # http2/limits must live on the transport: httpx ignores the client-level
+        # ones when an explicit transport is passed.
         self.client = httpx.AsyncClient(
+            follow_redirects=True,
             timeout=DEFAULT_REQUEST_TIMEOUT,
-            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20),
             headers=HEADERS,
+            transport=httpx.AsyncHTTPTransport(
+                http2=True,
+                limits=httpx.Limits(
+                    max_connections=HTTP_MAX_CONNECTIONS, max_keepalive_connections=50, keepalive_expiry=60,
+                ),
+                retries=2,
+            ),
         )
+        # httpx slows down sharply once requests queue inside its own pool, so callers
+        # wait here instead and the pool only ever sees requests it can serve at once.
+        self._http_slots = asyncio.Semaphore(HTTP_MAX_CONNECTIONS)
         self.redis = None
         self.default_limit = int(os.getenv("DL_GLOBAL_LIMIT", 3))
         self.compress_images = os.getenv("COMPRESS_IMAGES", "false").lower() == "true"
+        self._cpu_pool = ProcessPoolExecutor(max_workers=os.cpu_count()) if self.compress_images else None
+        self._script_shas = {}
+        # Per-source in-process image concurrency: (condition, [in_flight]).
+        # The cap follows the live Redis limit, so _auto_adjust_limit takes effect immediately.
+        self._source_cv = defaultdict(lambda: (asyncio.Condition(), [0]))
+        self._limits = {}
+        self._notify_tasks = set()  # strong refs for _release_image_nowait's wake-ups
+        # Results are counted locally ([success, error] per source) and flushed to Redis
+        # by a background task at most once per STATS_FLUSH_INTERVAL.
+        self._stats = defaultdict(lambda: [0, 0])
+        self._dirty = asyncio.Event()
+        self._flush_task = None
+        # Slot waiters park on a per-source Event that the keyspace listener sets
+        # whenever dl_active:{source} changes.
+        self._slot_events = {}
+        self._slot_listener_task = None
 
     async def connect_redis(self):
         if self.redis is None:
-            self.redis = aioredis.from_url(
-                os.getenv("REDIS_URL", "redis://redis:6379/0"),
-                decode_responses=True,
-            )
+            self.redis = aioredis.Redis(connection_pool=pool)
+        if not self._script_shas:
+            for name, script in SCRIPTS.items():
+                self._script_shas[name] = await self.redis.script_load(script)
+        if self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_stats_loop())
+        if self._slot_listener_task is None:
+            await self._enable_keyspace_events()
+            self._slot_listener_task = asyncio.create_task(self._slot_listener())
 
-    async def _record_result(self, source, success: bool):
-        await self.connect_redis()
-        base = f"dl_stats:{source.lower()}"
-        if success:
-            await self.redis.incr(f"{base}:success")
-        else:
-            await self.redis.incr(f"{base}:error")
-
-        if random.random() < 0.1:
-            succ = int(await self.redis.get(f"{base}:success") or 0)
-            err = int(await self.redis.get(f"{base}:error") or 0)
-            if succ + err > 200:
-                await self.redis.set(f"{base}:success", succ // 2)
-                await self.redis.set(f"{base}:error", err // 2)
-        await self._auto_adjust_limit(source)
+    async def _enable_keyspace_events(self):
+        try:
+            current = (await self.redis.config_get("notify-keyspace-events")).get("notify-keyspace-events", "")
+            missing = "".join(f for f in KEYSPACE_FLAGS if f not in current and not (f in "$g" and "A" in current))
+            if missing:
+                await self.redis.config_set("notify-keyspace-events", current + missing)
+        except ResponseError as e:
+            # CONFIG is often disabled on managed Redis; waiters fall back to SLOT_WAIT_TIMEOUT.
+            console.log(f"⚠️ Keyspace notifications unavailable: {e}")
+
+    async def _slot_listener(self):
+        db = self.redis.connection_pool.connection_kwargs.get("db", 0)
+        pattern = f"__keyspace@{db}__:dl_active:*"
+        while True:
+            try:
+                async with self.redis.pubsub() as ps:
+                    await ps.psubscribe(pattern)
+                    async for msg in ps.listen():
+                        # INCR is published as "incrby": an acquire never frees a slot, so skip it.
+                        if msg["type"] != "pmessage" or msg["data"] == b"incrby":
+                            continue
+                        source = msg["channel"].rsplit(b"dl_active:", 1)[1].decode()
+                        ev = self._slot_events.pop(source, None)
+                        if ev:
+                            ev.set()
+            except Exception as e:
+                console.log(f"❌ Slot listener error: {e}")
+                await asyncio.sleep(1)
+
+    async def close(self):
+        """Flush pending stats and release the HTTP client, Redis tasks and CPU pool."""
+        for task in (self._slot_listener_task, self._flush_task):
+            if task:
+                task.cancel()
+        self._slot_listener_task = self._flush_task = None
+        if self.redis is not None and self._stats:
+            await self._flush_stats()
+        await self.client.aclose()
+        if self._cpu_pool:
+            self._cpu_pool.shutdown(wait=False, cancel_futures=True)
+        if self.redis is not None:
+            await self.redis.aclose()
+            self.redis = None
+
+    async def _eval(self, name, numkeys, *keys_and_args):
+        try:
+            return await self.redis.evalsha(self._script_shas[name], numkeys, *keys_and_args)
+        except NoScriptError:
+            # Script cache was flushed (e.g. Redis restart) - load it again.
+            self._script_shas[name] = await self.redis.script_load(SCRIPTS[name])
+            return await self.redis.evalsha(self._script_shas[name], numkeys, *keys_and_args)
+
+    async def _try_acquire(self, stats_key, active_key):
+        return await self._eval("acquire", 2, stats_key, active_key, self.default_limit)
+
+    def _record_result(self, source, success: bool):
+        self._stats[source.lower()][0 if success else 1] += 1
+        self._dirty.set()
+
+    async def _flush_stats_loop(self):
+        while True:
+            await self._dirty.wait()
+            await asyncio.sleep(STATS_FLUSH_INTERVAL)
+            try:
+                await self._flush_stats()
+            except Exception as e:
+                console.log(f"❌ Stats flush failed: {e}")
+
+    async def _flush_stats(self):
+        self._dirty.clear()
+        stats, self._stats = self._stats, defaultdict(lambda: [0, 0])
+        for source, (succ_n, err_n) in stats.items():
+            succ, err, limit = await self._eval(
+                "decay", 2, f"dl_stats:{source}", "sources_seen",
+                succ_n, err_n, STATS_DECAY_THRESHOLD, source,
+            )
+            current = int(limit) if limit else self.default_limit
+            new = self._auto_adjust_limit(source, succ, err, current)
+            await self._refresh_limit(source, current if new is None else new)
+            if new is not None:
+                await self._set_limit(source, new)
 
     async def _get_limit(self, source):
         await self.connect_redis()
-        key = f"dl_limit:{source.lower()}"
-        val = await self.redis.get(key)
+        val = await self.redis.hget(f"dl_stats:{source.lower()}", "limit")
         return int(val) if val else self.default_limit
 
     async def _set_limit(self, source, val):
         await self.connect_redis()
-        await self.redis.set(f"dl_limit:{source.lower()}", val)
+        await self.redis.hset(f"dl_stats:{source.lower()}", "limit", val)
+
+    async def _refresh_limit(self, source, limit):
+        if self._limits.get(source) == limit:
+            return
+        self._limits[source] = limit
+        cv, _ = self._source_cv[source]
+        async with cv:
+            cv.notify_all()
+
+    async def _acquire_image(self, source, per_slot):
+        """Wait until `source` has fewer than limit * per_slot image requests in flight."""
+        cv, count = self._source_cv[source]
+        async with cv:
+            await cv.wait_for(lambda: count[0] < self._limits.get(source, self.default_limit) * per_slot)
+            count[0] += 1
+
+    def _release_image_nowait(self, source):
+        """Release from a done-callback: the slot frees now, waiters are woken by a short Task."""
+        self._source_cv[source][1][0] -= 1
+        task = asyncio.get_running_loop().create_task(self._notify_image(source))
+        self._notify_tasks.add(task)
+        task.add_done_callback(self._notify_tasks.discard)
+
+    async def _notify_image(self, source):
+        cv, _ = self._source_cv[source]
+        async with cv:
+            cv.notify_all()
 
-    async def _auto_adjust_limit(self, source):
-        succ = int(await self.redis.get(f"dl_stats:{source}:success") or 0)
-        err = int(await self.redis.get(f"dl_stats:{source}:error") or 0)
+    def _auto_adjust_limit(self, source, succ, err, current):
+        """Return the new limit for `source`, or None to keep `current`."""
         total = succ + err
         if total < 10:
-            return
-        current = await self._get_limit(source)
+            return None
         rate = err / total
         if rate > 0.3 and current > 1:
             new = current - 1
-            await self._set_limit(source, new)
             console.log(f"⚠️ Backoff {source}: error {rate:.0%}, limit {current}->{new}")
-        elif rate < 0.05 and current < 10:
+            return new
+        if rate < 0.05 and current < 10:
             new = current + 1
-            await self._set_limit(source, new)
             console.log(f"✅ Raise {source} limit {current}->{new}")
+            return new
+        return None
 
     async def _acquire_slot(self, source):
         await self.connect_redis()
-        key = f"dl_active:{source.lower()}"
+        source = source.lower()
+        stats_key, active_key = f"dl_stats:{source}", f"dl_active:{source}"
         while True:
-            limit = await self._get_limit(source)
-            active = int(await self.redis.get(key) or 0)
-            if active < limit:
-                await self.redis.incr(key)
+            # Grab the event before trying, so a release that lands mid-attempt still wakes us.
+            ev = self._slot_events.setdefault(source, asyncio.Event())
+            if await self._try_acquire(stats_key, active_key):
                 return
-            await asyncio.sleep(1)
+            try:
+                await asyncio.wait_for(ev.wait(), SLOT_WAIT_TIMEOUT)
+            except TimeoutError:
+                pass
 
     async def _release_slot(self, source):
         await self.connect_redis()
+        # The DECR itself publishes the keyspace event that wakes waiters.
         await self.redis.decr(f"dl_active:{source.lower()}")
 
     async def download_chapter(self, manga_title, chapter_title, urls, source_url=None, sem_limit=8):
         source = getattr(find_source_for_url(source_url or ""), "name", "global").lower()
         await self._acquire_slot(source)
         try:
+            await self._refresh_limit(source, await self._get_limit(source))
             folder = self.output_dir / manga_title / chapter_title
             folder.mkdir(parents=True, exist_ok=True)
-            sem = asyncio.Semaphore(sem_limit)
             total, done = len(urls), 0
+            # ETags of this chapter's unfinished (.part) images, used to resume them safely.
+            etag_key = f"etag:{manga_title}:{chapter_title}"
+            etags = {k.decode(): v.decode() for k, v in (await self.redis.hgetall(etag_key)).items()}
+            new_etags, finished = {}, []
 
-            async def save(i, url):
+            async def save(name, ext, url):
+                # Called with an image slot already held; its done-callback releases it.
                 nonlocal done
-                ext = Path(url).suffix or ".jpg"
-                dest = folder / f"{i:03d}{ext}"
-                if dest.exists() and dest.stat().st_size > 0:
-                    return
+                dest = f"{folder_str}/{name}"
+                part = f"{dest}.part"
+                offset = existing.get(f"{name}.part", 0)
+                headers = {}
+                if offset and name in etags:
+                    # If-Range: the server sends only the missing tail if the image is unchanged,
+                    # otherwise the full body (200) and we start over.
+                    headers = {"Range": f"bytes={offset}-", "If-Range": etags[name]}
                 try:
-                    async with sem, self.client.stream("GET", url) as r:
+                    async with self._http_slots, self.client.stream("GET", url, headers=headers) as r:
+                        if r.status_code == 416:
+                            # Stale partial file - drop it so the next run starts clean.
+                            await aiofiles.os.remove(part)
                         r.raise_for_status()
-                        with open(dest, "wb") as f:
-                            async for chunk in r.aiter_bytes():
-                                f.write(chunk)
-                    if self.compress_images:
-                        img = Image.open(dest).convert("RGB")
-                        img.save(dest, "JPEG", quality=85, optimize=True)
+                        if etag := r.headers.get("etag"):
+                            new_etags[name] = etag
+                        resumed = r.status_code == 206
+                        size = offset if resumed else 0
+                        async with aiofiles.open(part, "ab" if resumed else "wb") as f:
+                            async for chunk in r.aiter_bytes(DOWNLOAD_CHUNK_SIZE):
+                                await f.write(chunk)
+                                size += len(chunk)
+                            if not self.compress_images and hasattr(os, "posix_fadvise"):
+                                # Bulk downloads are rarely re-read soon; keep them out of the page cache.
+                                await f.flush()
+                                os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+                    # Only complete files get the final name, so "exists" means "done".
+                    await aiofiles.os.replace(part, dest)
+                    # Complete files are skipped without a request, so their ETag is never read again.
+                    new_etags.pop(name, None)
+                    if name in etags:
+                        finished.append(name)
+                    if self.compress_images and not (ext.lower() in JPEG_EXTS and size <= RECOMPRESS_MIN_BYTES):
+                        loop = asyncio.get_running_loop()
+                        await loop.run_in_executor(self._cpu_pool, _recompress, dest)
                     done += 1
-                    await self._record_result(source, True)
+                    self._record_result(source, True)
                 except Exception as e:
                     console.log(f"❌ {url}: {e}")
-                    await self._record_result(source, False)
+                    self._record_result(source, False)
+
+            def release(_task):
+                self._release_image_nowait(source)
+
+            # One directory scan instead of exists()/stat() per image.
+            existing = {e.name: e.stat().st_size for e in os.scandir(folder)}
+            folder_str = str(folder)
 
-            await asyncio.gather(*(save(i, u) for i, u in enumerate(urls, 1)))
+            try:
+                async with asyncio.TaskGroup() as tg:
+                    for i, url in enumerate(urls, 1):
+                        ext = os.path.splitext(url)[1] or ".jpg"
+                        name = f"{i:03d}{ext}"
+                        if existing.get(name, 0) > 0:
+                            continue
+                        # Schedule a task only once a slot is free, so a huge chapter never
+                        # queues thousands of idle Tasks up front. The done-callback gives the
+                        # slot back however the task ends, even if it is cancelled before it runs.
+                        await self._acquire_image(source, sem_limit)
+                        tg.create_task(save(name, ext, url)).add_done_callback(release)
+            finally:
+                if new_etags or finished:
+                    pipe = self.redis.pipeline(transaction=False)
+                    if new_etags:
+                        pipe.hset(etag_key, mapping=new_etags)
+                        pipe.expire(etag_key, ETAG_TTL)
+                    if finished:
+                        pipe.hdel(etag_key, *finished)
+                    await pipe.execute()
             console.log(f"✅ {source} {manga_title} {chapter_title}: {done}/{total}")
         finally:
             await self._release_slot(source)
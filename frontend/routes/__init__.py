@@ -0,0 +1,4 @@
+"""
+frontend/routes
+API routers mounted by frontend/server.py under /api/v1.
+"""
@@ -0,0 +1,92 @@
+"""
+frontend/routes/jobs.py
+Download queue: enqueue, progress, history and cancellation.
+"""
+
+import uuid
+import orjson
+from fastapi import APIRouter, Body, HTTPException, Request
+from redis.exceptions import WatchError
+
+from scrapers.manga import validate_manga_url
+
+router = APIRouter()
+
+# -------------------------------------------------------
+# 📥 Download Management
+# -------------------------------------------------------
+
+@router.post("/download")
+async def trigger_download(request: Request, data: dict = Body(...)):
+    """Start a new manga/chapter download."""
+    url = data.get("url")
+    if not url:
+        raise HTTPException(400, "Missing 'url'")
+    if not validate_manga_url(url):
+        raise HTTPException(400, "Invalid or unsupported URL")
+
+    # Scraping happens in the worker; the request only enqueues the job.
+    job_id = str(uuid.uuid4())
+    job_data = {
+        "id": job_id,
+        "url": url,
+        "title": url,
+        "total_chapters": 0,
+        "status": "queued"
+    }
+
+    r = request.app.state.redis
+    payload = orjson.dumps(job_data)
+    async with r.pipeline(transaction=True) as pipe:
+        pipe.set(f"job:{job_id}", payload)
+        pipe.sadd("jobs:all", job_id)
+        pipe.lpush("download_jobs", payload)
+        await pipe.execute()
+    return {"message": f"Download queued for {url}", "job_id": job_id}
+
+@router.get("/progress/{job_id}")
+async def get_progress(job_id: str, request: Request):
+    """Return progress for a job."""
+    r = request.app.state.redis
+    job_data = await r.get(f"job:{job_id}")
+    if not job_data:
+        raise HTTPException(404, "Job not found")
+    job = orjson.loads(job_data)
+    prog = await r.get(f"progress:{job_id}") or "0"
+    job["progress"] = int(prog)
+    return job
+
+@router.get("/history")
+async def get_history(request: Request):
+    """Return completed/failed jobs."""
+    r = request.app.state.redis
+    ids = await r.smembers("jobs:done")
+    if not ids:
+        return []
+    raws = await r.mget([b"job:" + job_id for job_id in ids])
+    jobs = [orjson.loads(raw) for raw in raws if raw]
+    results = [job for job in jobs if job["status"] in ("completed", "failed")]
+    return sorted(results, key=lambda j: j.get("title", ""))
+
+@router.post("/cancel/{job_id}")
+async def cancel_download(job_id: str, request: Request):
+    """Cancel a queued or running job."""
+    r = request.app.state.redis
+    key = f"job:{job_id}"
+    # WATCH/MULTI so a concurrent worker update can't overwrite (or be overwritten by) the cancel.
+    async with r.pipeline(transaction=True) as pipe:
+        while True:
+            try:
+                await pipe.watch(key)
+                job_data = await pipe.get(key)
+                if not job_data:
+                    raise HTTPException(404, "Job not found")
+                job = orjson.loads(job_data)
+                job["status"] = "cancelled"
+                pipe.multi()
+                pipe.set(key, orjson.dumps(job))
+                await pipe.execute()
+                break
+            except WatchError:
+                continue
+    return {"message": f"Job {job_id} cancelled"}
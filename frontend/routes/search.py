@@ -0,0 +1,136 @@
+"""
+frontend/routes/search.py
+Multi-source manga search.
+"""
+
+import asyncio
+import orjson
+from fastapi import APIRouter, Query, Request
+from selectolax.lexbor import LexborHTMLParser as HTMLParser
+
+router = APIRouter()
+
+# -------------------------------------------------------
+# 🔍 Multi-Source Search
+# -------------------------------------------------------
+
+SEARCH_SOURCE_TIMEOUT = 3.0
+
+_MANGAPILL_SEL = "a[href^='/manga/']"
+_MANGASEE_SEL = "a.SeriesName"
+_MANGAKAKALOT_ITEM_SEL = ".story_item"
+
+def _parse_mangapill(html):
+    items = []
+    for a in HTMLParser(html).css(_MANGAPILL_SEL):
+        title = a.text(strip=True)
+        href = a.attributes.get("href")
+        if href and title:
+            items.append({
+                "title": title,
+                "url": f"https://mangapill.com{href}",
+                "source": "Mangapill"
+            })
+    return items
+
+def _parse_mangasee(html):
+    items = []
+    for a in HTMLParser(html).css(_MANGASEE_SEL):
+        title = a.text(strip=True)
+        href = a.attributes.get("href")
+        if href and title:
+            items.append({
+                "title": title,
+                "url": f"https://mangasee123.com{href}",
+                "source": "MangaSee"
+            })
+    return items
+
+def _first_link_and_heading(item):
+    """First a.item-img and first h3 under `item` (document order), without a per-item selector."""
+    a = h3 = None
+    for node in item.traverse():
+        if a is None and node.tag == "a" and "item-img" in (node.attributes.get("class") or "").split():
+            a = node
+        elif h3 is None and node.tag == "h3":
+            h3 = node
+        if a is not None and h3 is not None:
+            break
+    return a, h3
+
+def _parse_mangakakalot(html):
+    items = []
+    # One selector compile per page; the per-item lookups walk the subtree instead.
+    for item in HTMLParser(html).css(_MANGAKAKALOT_ITEM_SEL):
+        a, title_tag = _first_link_and_heading(item)
+        if a is None:
+            continue
+        title = title_tag.text(strip=True) if title_tag else "Unknown"
+        items.append({
+            "title": title,
+            "url": a.attributes.get("href"),
+            "source": "Mangakakalot"
+        })
+    return items
+
+@router.get("/search")
+async def search_manga(request: Request, q: str = Query(..., description="Search query")):
+    """Search across Mangapill, MangaDex, MangaSee, and Mangakakalot."""
+    q_clean = q.strip()
+    client = request.app.state.search_client
+
+    # HTML parsing runs in a thread so the loop keeps serving the other sources.
+    async def fetch_mangapill():
+        url = f"https://mangapill.com/search?q={q_clean.replace(' ', '+')}"
+        r = await client.get(url)
+        return await asyncio.to_thread(_parse_mangapill, r.text)
+
+    async def fetch_mangasee():
+        url = f"https://mangasee123.com/search/?name={q_clean.replace(' ', '+')}"
+        r = await client.get(url)
+        return await asyncio.to_thread(_parse_mangasee, r.text)
+
+    async def fetch_mangadex():
+        url = f"https://api.mangadex.org/manga?limit=10&title={q_clean}"
+        r = await client.get(url)
+        data = orjson.loads(r.content)
+        items = []
+        for item in data.get("data", []):
+            title = item["attributes"]["title"].get("en") or list(item["attributes"]["title"].values())[0]
+            items.append({
+                "title": title,
+                "url": f"https://mangadex.org/title/{item['id']}",
+                "source": "MangaDex"
+            })
+        return items
+
+    async def fetch_mangakakalot():
+        url = f"https://mangakakalot.com/search/story/{q_clean.replace(' ', '_')}"
+        r = await client.get(url)
+        return await asyncio.to_thread(_parse_mangakakalot, r.text)
+
+    async def guarded(fetch):
+        # A slow or broken source must not hold up (or fail) the whole search.
+        try:
+            return await asyncio.wait_for(fetch(), SEARCH_SOURCE_TIMEOUT)
+        except Exception as e:
+            print(f"⚠️ Search source {fetch.__name__} failed: {e!r}")
+            return []
+
+    batches = await asyncio.gather(
+        guarded(fetch_mangapill),
+        guarded(fetch_mangadex),
+        guarded(fetch_mangasee),
+        guarded(fetch_mangakakalot)
+    )
+    results = [item for batch in batches for item in batch]
+
+    # Deduplicate and sort
+    seen = set()
+    final = []
+    for r in results:
+        key = f"{r['title']}-{r['source']}"
+        if key not in seen:
+            seen.add(key)
+            final.append(r)
+    return sorted(final, key=lambda r: r["source"])
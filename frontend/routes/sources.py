@@ -0,0 +1,98 @@
+"""
+frontend/routes/sources.py
+Source list management and per-source download limiter status.
+"""
+
+import time
+import orjson
+import asyncio
+from fastapi import APIRouter, Body, HTTPException, Request
+
+router = APIRouter()
+
+# -------------------------------------------------------
+# ⚙️ Source Management
+# -------------------------------------------------------
+
+@router.get("/sources")
+async def get_sources(request: Request):
+    """Return list of sources (auto-initializes defaults)."""
+    r = request.app.state.redis
+    raw = await r.get("sources")
+    if not raw:
+        defaults = ["Mangapill", "MangaDex", "MangaSee", "Mangakakalot"]
+        await r.set("sources", orjson.dumps(defaults))
+        return defaults
+    try:
+        return orjson.loads(raw)
+    except Exception:
+        return ["Mangapill"]
+
+@router.post("/sources")
+async def add_source(request: Request, data: dict = Body(...)):
+    """Add a new source dynamically."""
+    r = request.app.state.redis
+    src = data.get("name")
+    if not src:
+        raise HTTPException(400, "Missing 'name'")
+    current = orjson.loads(await r.get("sources") or "[]")
+    if src not in current:
+        current.append(src)
+        await r.set("sources", orjson.dumps(current))
+    return {"sources": current}
+
+@router.delete("/sources/{name}")
+async def remove_source(name: str, request: Request):
+    """Remove a source."""
+    r = request.app.state.redis
+    current = orjson.loads(await r.get("sources") or "[]")
+    updated = [s for s in current if s.lower() != name.lower()]
+    await r.set("sources", orjson.dumps(updated))
+    return {"sources": updated}
+
+# Dashboards poll this from every open tab: callers within STATUS_CACHE_TTL share one
+# Redis read, and callers arriving while a read is in flight wait on that same read.
+STATUS_CACHE_TTL = 0.25
+_status_cache = (0.0, None)
+_status_task = None
+
+async def _read_source_status(r, default_limit):
+    # Two round trips regardless of source count: the index, then one pipelined HMGET each.
+    sources = sorted(src.decode() for src in await r.smembers("sources_seen"))
+    pipe = r.pipeline(transaction=False)
+    for src in sources:
+        pipe.hmget(f"dl_stats:{src}", "success", "error", "limit")
+    stats = await pipe.execute()
+
+    status = []
+    for src, (succ, err, limit) in zip(sources, stats):
+        succ, err = int(succ or 0), int(err or 0)
+        total = succ + err
+        status.append({
+            "source": src,
+            "limit": int(limit or default_limit),
+            "success": succ,
+            "error": err,
+            "error_rate": round(err * 100 / total, 1) if total else 0,
+        })
+    return status
+
+def _status_read_done(task):
+    global _status_cache, _status_task
+    _status_task = None
+    if not task.cancelled() and task.exception() is None:
+        _status_cache = (time.monotonic(), task.result())
+
+@router.get("/settings/source-status")
+async def get_source_status(request: Request):
+    """Per-source limiter and success stats (sources indexed in `sources_seen`)."""
+    global _status_task
+    ts, cached = _status_cache
+    if cached is not None and time.monotonic() - ts < STATUS_CACHE_TTL:
+        return cached
+    if _status_task is None:
+        state = request.app.state
+        _status_task = asyncio.create_task(_read_source_status(state.redis, state.manager.default_limit))
+        _status_task.add_done_callback(_status_read_done)
+    # Shielded so one client disconnecting doesn't cancel the read the others are awaiting.
+    return await asyncio.shield(_status_task)
@@ -1,243 +1,122 @@
 """
 frontend/server.py
 Astas888 Manga v2 - FastAPI backend
-Handles frontend serving, search, source management, and download queue.
+App wiring, lifecycle and frontend serving; API endpoints live in frontend/routes.
 """
 
 import os
-import json
-import uuid
+import re
+import gzip
+import hashlib
+import mimetypes
+import brotli
 import asyncio
 import redis.asyncio as aioredis
-from fastapi import FastAPI, Body, HTTPException, Query
-from fastapi.responses import FileResponse, HTMLResponse
-from fastapi.staticfiles import StaticFiles
-from bs4 import BeautifulSoup
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import HTMLResponse, ORJSONResponse, Response
 import httpx
 
 from downloader.async_manager import AsyncDownloadManager
-from scrapers.manga import scrape_manga, validate_manga_url
+from frontend.routes import jobs, search, sources
+from redis_pool import pool
 
 # -------------------------------------------------------
 # 🚀 Initialization
 # -------------------------------------------------------
 
-app = FastAPI(title="Astas888 Manga v2", version="2.0.0")
-app.state.manager = AsyncDownloadManager()
+app = FastAPI(title="Astas888 Manga v2", version="2.0.0", default_response_class=ORJSONResponse)
 frontend_dir = "/app/frontend"
 
-app.mount("/", StaticFiles(directory=frontend_dir, html=True), name="frontend")
-
 # -------------------------------------------------------
 # 🧠 Startup / Health
 # -------------------------------------------------------
 
 @app.on_event("startup")
 async def startup():
-    app.state.redis = aioredis.from_url("redis://redis:6379/0", decode_responses=True)
-    print("✅ Redis connected.")
+    app.state.redis_pool = pool
+    app.state.redis = aioredis.Redis(connection_pool=pool)
+    # Built here, not at import, so its httpx client binds to uvicorn's running loop.
+    app.state.manager = AsyncDownloadManager()
+    app.state.search_client = httpx.AsyncClient(
+        http2=True,
+        timeout=5,
+        limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+    )
+    app.state.static_cache = _build_static_cache(frontend_dir)
+    print(f"✅ Redis connected ({type(asyncio.get_running_loop()).__module__} event loop).")
+
+@app.on_event("shutdown")
+async def shutdown():
+    await app.state.search_client.aclose()
+    await app.state.manager.close()
+    await app.state.redis.aclose()
+    await app.state.redis_pool.disconnect()
 
 @app.get("/health")
 async def health():
     return {"status": "ok"}
 
 # -------------------------------------------------------
-# ⚙️ Source Management
+# 🔌 API routers
 # -------------------------------------------------------
 
-@app.get("/api/v1/sources")
-async def get_sources():
-    """Return list of sources (auto-initializes defaults)."""
-    r = app.state.redis
-    raw = await r.get("sources")
-    if not raw:
-        defaults = ["Mangapill", "MangaDex", "MangaSee", "Mangakakalot"]
-        await r.set("sources", json.dumps(defaults))
-        return defaults
-    try:
-        return json.loads(raw)
-    except Exception:
-        return ["Mangapill"]
-
-@app.post("/api/v1/sources")
-async def add_source(data: dict = Body(...)):
-    """Add a new source dynamically."""
-    r = app.state.redis
-    src = data.get("name")
-    if not src:
-        raise HTTPException(400, "Missing 'name'")
-    current = json.loads(await r.get("sources") or "[]")
-    if src not in current:
-        current.append(src)
-        await r.set("sources", json.dumps(current))
-    return {"sources": current}
-
-@app.delete("/api/v1/sources/{name}")
-async def remove_source(name: str):
-    """Remove a source."""
-    r = app.state.redis
-    current = json.loads(await r.get("sources") or "[]")
-    updated = [s for s in current if s.lower() != name.lower()]
-    await r.set("sources", json.dumps(updated))
-    return {"sources": updated}
+# Registered before the static catch-all below, which would otherwise shadow them.
+app.include_router(sources.router, prefix="/api/v1")
+app.include_router(search.router, prefix="/api/v1")
+app.include_router(jobs.router, prefix="/api/v1")
 
 # -------------------------------------------------------
-# 🔍 Multi-Source Search
+# 🧭 Frontend (static files)
 # -------------------------------------------------------
 
-@app.get("/api/v1/search")
-async def search_manga(q: str = Query(..., description="Search query")):
-    """Search across Mangapill, MangaDex, MangaSee, and Mangakakalot."""
-    q_clean = q.strip()
-    results = []
-
-    async def fetch_mangapill(client):
-        url = f"https://mangapill.com/search?q={q_clean.replace(' ', '+')}"
-        r = await client.get(url)
-        soup = BeautifulSoup(r.text, "html.parser")
-        for a in soup.select("a[href^='/manga/']"):
-            title = a.text.strip()
-            href = a.get("href")
-            if href and title:
-                results.append({
-                    "title": title,
-                    "url": f"https://mangapill.com{href}",
-                    "source": "Mangapill"
-                })
-
-    async def fetch_mangasee(client):
-        url = f"https://mangasee123.com/search/?name={q_clean.replace(' ', '+')}"
-        r = await client.get(url)
-        soup = BeautifulSoup(r.text, "html.parser")
-        for div in soup.select("a.SeriesName"):
-            title = div.text.strip()
-            href = div.get("href")
-            if href and title:
-                results.append({
-                    "title": title,
-                    "url": f"https://mangasee123.com{href}",
-                    "source": "MangaSee"
-                })
-
-    async def fetch_mangadex(client):
-        url = f"https://api.mangadex.org/manga?limit=10&title={q_clean}"
-        r = await client.get(url)
-        data = r.json()
-        for item in data.get("data", []):
-            title = item["attributes"]["title"].get("en") or list(item["attributes"]["title"].values())[0]
-            results.append({
-                "title": title,
-                "url": f"https://mangadex.org/title/{item['id']}",
-                "source": "MangaDex"
-            })
-
-    async def fetch_mangakakalot(client):
-        url = f"https://mangakakalot.com/search/story/{q_clean.replace(' ', '_')}"
-        r = await client.get(url)
-        soup = BeautifulSoup(r.text, "html.parser")
-        for a in soup.select(".story_item a.item-img"):
-            href = a.get("href")
-            title_tag = a.find_next("h3")
-            title = title_tag.text.strip() if title_tag else "Unknown"
-            results.append({
-                "title": title,
-                "url": href,
-                "source": "Mangakakalot"
-            })
-
-    async with httpx.AsyncClient(timeout=10) as client:
-        await asyncio.gather(
-            fetch_mangapill(client),
-            fetch_mangadex(client),
-            fetch_mangasee(client),
-            fetch_mangakakalot(client)
-        )
-
-    # Deduplicate and sort
-    seen = set()
-    final = []
-    for r in results:
-        key = f"{r['title']}-{r['source']}"
-        if key not in seen:
-            seen.add(key)
-            final.append(r)
-    return sorted(final, key=lambda r: r["source"])
-
-# -------------------------------------------------------
-# 📥 Download Management
-# -------------------------------------------------------
-
-@app.post("/api/v1/download")
-async def trigger_download(data: dict = Body(...)):
-    """Start a new manga/chapter download."""
-    url = data.get("url")
-    if not url:
-        raise HTTPException(400, "Missing 'url'")
-    if not validate_manga_url(url):
-        raise HTTPException(400, "Invalid or unsupported URL")
-
-    manga_data = scrape_manga(url)
-    if not manga_data or not manga_data["chapters"]:
-        raise HTTPException(400, "Could not fetch chapters.")
-
-    job_id = str(uuid.uuid4())
-    job_data = {
-        "id": job_id,
-        "url": url,
-        "title": manga_data["title"],
-        "total_chapters": len(manga_data["chapters"]),
-        "status": "queued"
+_COMPRESSIBLE = (".html", ".js", ".css", ".json", ".svg", ".txt")
+# Only content-hashed names (e.g. app.3f9a1c2b.js) may be cached forever;
+# everything else is revalidated against its ETag.
+_HASHED_ASSET_RE = re.compile(r"\.[0-9a-f]{8,}\.\w+$")
+
+def _build_static_cache(root):
+    """Read the frontend into memory once: {path: (body, etag, gzip, brotli, media_type)}."""
+    cache = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [d for d in dirnames if d != "__pycache__"]
+        for name in filenames:
+            if name.endswith((".py", ".pyc")):
+                continue  # backend code lives next to the assets - never serve it
+            full = os.path.join(dirpath, name)
+            rel = os.path.relpath(full, root).replace(os.sep, "/")
+            with open(full, "rb") as f:
+                body = f.read()
+            etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+            gz = br = None
+            if name.endswith(_COMPRESSIBLE):
+                gz = gzip.compress(body, 9)
+                br = brotli.compress(body, quality=11)
+            media_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+            cache[rel] = (body, etag, gz, br, media_type)
+    return cache
+
+@app.api_route("/{path:path}", methods=["GET", "HEAD"], include_in_schema=False)
+async def serve_frontend(path: str, request: Request):
+    """Serve the Vue dashboard and its assets from the in-memory cache."""
+    cache = app.state.static_cache
+    key = path.strip("/") or "index.html"
+    entry = cache.get(key) or cache.get(f"{key}/index.html")
+    if entry is None:
+        if key == "index.html":
+            return HTMLResponse("<h1>Astas888 Manga API</h1><p>Frontend not found.</p>", status_code=404)
+        raise HTTPException(404, "Not found")
+
+    body, etag, gz, br, media_type = entry
+    headers = {
+        "ETag": etag,
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "public, max-age=31536000, immutable" if _HASHED_ASSET_RE.search(key) else "no-cache",
     }
-
-    r = app.state.redis
-    await r.set(f"job:{job_id}", json.dumps(job_data))
-    await r.lpush("download_jobs", json.dumps(job_data))
-    return {"message": f"Download started for {manga_data['title']}", "job_id": job_id}
-
-@app.get("/api/v1/progress/{job_id}")
-async def get_progress(job_id: str):
-    """Return progress for a job."""
-    r = app.state.redis
-    job_data = await r.get(f"job:{job_id}")
-    if not job_data:
-        raise HTTPException(404, "Job not found")
-    job = json.loads(job_data)
-    prog = await r.get(f"progress:{job_id}") or "0"
-    job["progress"] = int(prog)
-    return job
-
-@app.get("/api/v1/history")
-async def get_history():
-    """Return completed/failed jobs."""
-    r = app.state.redis
-    keys = await r.keys("job:*")
-    results = []
-    for key in keys:
-        job = json.loads(await r.get(key))
-        if job["status"] in ("completed", "failed"):
-            results.append(job)
-    return sorted(results, key=lambda j: j.get("title", ""))
-
-@app.post("/api/v1/cancel/{job_id}")
-async def cancel_download(job_id: str):
-    """Cancel a queued or running job."""
-    r = app.state.redis
-    job_data = await r.get(f"job:{job_id}")
-    if not job_data:
-        raise HTTPException(404, "Job not found")
-    job = json.loads(job_data)
-    job["status"] = "cancelled"
-    await r.set(f"job:{job_id}", json.dumps(job))
-    return {"message": f"Job {job_id} cancelled"}
-
-# -------------------------------------------------------
-# 🧭 Frontend (index.html)
-# -------------------------------------------------------
-
-@app.get("/", response_class=HTMLResponse)
-async def serve_index():
-    """Serve the Vue dashboard."""
-    index_path = os.path.join(frontend_dir, "index.html")
-    if os.path.exists(index_path):
-        return FileResponse(index_path)
-    return HTMLResponse("<h1>Astas888 Manga API</h1><p>Frontend not found.</p>", status_code=404)
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    accept = request.headers.get("accept-encoding", "")
+    if br is not None and "br" in accept:
+        body, headers["Content-Encoding"] = br, "br"
+    elif gz is not None and "gzip" in accept:
+        body, headers["Content-Encoding"] = gz, "gzip"
+    return Response(body, media_type=media_type, headers=headers)
@@ -0,0 +1,18 @@
+"""
+redis_pool.py
+Process-wide Redis connection pool shared by the API server, downloader and worker.
+Callers block (up to `timeout` seconds) for a free connection instead of opening new sockets.
+Replies are raw bytes: payloads go straight to orjson, and callers decode the few
+names (set members, hash fields, channels) they use as text.
+"""
+
+import redis.asyncio as aioredis
+from config import get_config
+
+cfg = get_config()
+
+pool = aioredis.BlockingConnectionPool.from_url(
+    cfg.redis_url,
+    max_connections=cfg.redis_pool_size,
+    timeout=20,
+)
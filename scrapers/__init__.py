@@ -3,11 +3,17 @@ Scrapers package for Astas888 Manga.
 Contains site-specific and general scraping utilities.
 """
 
-from .manga import scrape_manga, validate_manga_url
+import logging
+
+from .manga import Chapter, scrape_manga, validate_manga_url
 # from .chapter import scrape_chapter  # Uncomment if you add chapter scraping
 
 __all__ = [
+    "Chapter",
     "scrape_manga",
     "validate_manga_url",
     # "scrape_chapter",
 ]
+
+# Library-style logging: silent unless the entrypoint configures handlers.
+logging.getLogger(__name__).addHandler(logging.NullHandler())
@@ -5,30 +5,54 @@ Currently supports Mangapill.
 """
 
 import re
-import httpx
-from bs4 import BeautifulSoup
-from constants import BASE_URL, HEADERS, DEFAULT_REQUEST_TIMEOUT
-from rich.console import Console
+import logging
+import asyncio
+from functools import lru_cache
+from constants import BASE_URL
+from scrapers.session import parse_url
 
-console = Console()
+log = logging.getLogger(__name__)
+
+_CHAPTER_URL_RE = re.compile(r"^https?://(www\.)?mangapill\.com/chapter/[\w\-]+")
 
 # -------------------------------------------------------
 # 🔍 Validate Chapter URL
 # -------------------------------------------------------
 
+@lru_cache(maxsize=1024)
 def validate_chapter_url(url: str) -> bool:
     """
     Checks if a URL looks like a valid Mangapill chapter page.
     Example: https://mangapill.com/chapter/one-piece-chapter-1001
     """
-    return bool(re.match(r"^https?://(www\.)?mangapill\.com/chapter/[\w\-]+", url))
+    return bool(_CHAPTER_URL_RE.match(url))
 
 
 # -------------------------------------------------------
 # 📸 Extract Chapter Images
 # -------------------------------------------------------
 
-def scrape_chapter_images(url: str):
+async def _parse_chapter_images(images_iter):
+    # Reader images (src under /manga/) if there are any, otherwise every <img> on the page.
+    reader, fallback = [], []
+    async for img in images_iter:
+        src = img.get("data-src") or img.get("src")
+        if not src:
+            continue
+        (reader if "/manga/" in (img.get("src") or "") else fallback).append(src)
+
+    seen = set()
+    images = []
+    for src in reader or fallback:
+        if not src.startswith("http"):
+            src = BASE_URL + src
+        if src in seen:
+            continue
+        seen.add(src)
+        images.append(src)
+    return images
+
+async def scrape_chapter_images(url: str):
     """
     Scrapes all page image URLs for a given chapter.
     Returns a list of URLs (usually .jpg or .png)
@@ -36,30 +60,14 @@ def scrape_chapter_images(url: str):
     if not validate_chapter_url(url):
         raise ValueError(f"Invalid chapter URL: {url}")
 
-    console.log(f"🌐 Fetching chapter: {url}")
+    log.debug("🌐 Fetching chapter: %s", url)
     try:
-        resp = httpx.get(url, headers=HEADERS, timeout=DEFAULT_REQUEST_TIMEOUT)
-        resp.raise_for_status()
+        # Parsed as it downloads; only <img> elements are reported.
+        images = await parse_url(url, ("img",), _parse_chapter_images)
     except Exception as e:
-        console.log(f"[red]Failed to fetch chapter page:[/red] {e}")
+        log.warning("Failed to fetch chapter page %s: %s", url, e)
         return []
-
-    soup = BeautifulSoup(resp.text, "html.parser")
-
-    # Try to find all images used in the reader
-    image_tags = soup.select("img[src*='/manga/']") or soup.find_all("img")
-
-    images = []
-    for img in image_tags:
-        src = img.get("data-src") or img.get("src")
-        if not src:
-            continue
-        if not src.startswith("http"):
-            src = BASE_URL + src
-        if src not in images:
-            images.append(src)
-
-    console.log(f"🖼️ Found {len(images)} pages for chapter {url.split('/')[-1]}")
+    log.debug("🖼️ Found %d pages for chapter %s", len(images), url[url.rfind("/") + 1:])
     return images
 
 
@@ -69,7 +77,7 @@ def scrape_chapter_images(url: str):
 
 if __name__ == "__main__":
     test_url = "https://mangapill.com/chapter/one-piece-chapter-1001"
-    imgs = scrape_chapter_images(test_url)
+    imgs = asyncio.run(scrape_chapter_images(test_url))
     print(f"Found {len(imgs)} images:")
     for i, img in enumerate(imgs[:5], 1):
         print(f"{i}. {img}")
@@ -4,30 +4,125 @@ Scrapes manga metadata and chapter listings from supported sources (e.g. Mangapi
 """
 
 import re
-import httpx
-from bs4 import BeautifulSoup
-from constants import BASE_URL, HEADERS, DEFAULT_REQUEST_TIMEOUT
-from rich.console import Console
-
-console = Console()
+import logging
+import orjson
+import redis.asyncio as aioredis
+from dataclasses import dataclass
+from functools import lru_cache
+from constants import BASE_URL
+from redis_pool import pool
+from scrapers.session import parse_url
+
+log = logging.getLogger(__name__)
+_redis = aioredis.Redis(connection_pool=pool)
+
+# Manga pages change slowly; reuse a parse for a while across retries and repeat jobs.
+SCRAPE_CACHE_TTL = 900
+
+_MANGA_URL_RE = re.compile(r"^https?://(www\.)?mangapill\.com/manga/[\w\-]+")
+_AUTHOR_RE = re.compile("Author")
+_CH_NUM_RE = re.compile(r"chapter-(\d+(?:\.\d+)?)")
+# Tags the lookups below touch: title, author label/link, description, chapters.
+_PAGE_TAGS = ("h1", "label", "p", "div", "a")
+# Elements whose full text is read (chapter titles included), so targets nested inside
+# them must outlive their own end event.
+_TEXT_TAGS = frozenset(("h1", "label", "p", "a"))
+_DESC_CLASS = "manga-description"
+
+@dataclass(slots=True)
+class Chapter:
+    """One chapter link; slotted because long series produce thousands of these."""
+    title: str
+    url: str
 
 # -------------------------------------------------------
 # 🧩 URL Validation
 # -------------------------------------------------------
 
+@lru_cache(maxsize=1024)
 def validate_manga_url(url: str) -> bool:
     """
     Ensure the provided URL matches known manga patterns.
     Example: https://mangapill.com/manga/one-piece
     """
-    return bool(re.match(r"^https?://(www\.)?mangapill\.com/manga/[\w\-]+", url))
+    return bool(_MANGA_URL_RE.match(url))
 
 
 # -------------------------------------------------------
 # 🧠 Manga Scraper
 # -------------------------------------------------------
 
-def scrape_manga(url: str):
+def _chapter_title(a):
+    # Text pieces stripped and space-joined, so "Chapter <b>2</b>" reads "Chapter 2".
+    return " ".join(filter(None, (s.strip() for s in a.itertext())))
+
+def _is_description(el):
+    return el.tag == "div" and _DESC_CLASS in (el.get("class") or "").split()
+
+def _keeps_text(el):
+    return el.tag in _TEXT_TAGS or _is_description(el)
+
+def _after_author_label(a):
+    # Text just before the link: the previous sibling (and its tail), else the parent's lead text.
+    prev = a.getprevious()
+    if prev is None:
+        parent = a.getparent()
+        before = parent.text if parent is not None else None
+    else:
+        before = (prev.text or "") + (prev.tail or "")
+    return bool(before and _AUTHOR_RE.search(before))
+
+async def _parse_manga(elements):
+    """Build the manga dict from streamed h1/label/p/div/a elements, in document order."""
+    title = first_h1 = author = description = first_p = None
+    author_next = False
+    chapters_by_url = {}
+    async for el in elements:
+        if el.tag == "a":
+            # Author: the first link after an "Author" label. A link inside the label's
+            # own element ("<p>Author: <a>Oda</a></p>") ends before it, so look back too.
+            if author is None and (author_next or _after_author_label(el)):
+                author, author_next = "".join(el.itertext()).strip(), False
+            href = el.get("href")
+            if not href or "/chapter/" not in href:
+                continue
+            ch_url = href if href.startswith("http") else BASE_URL + href
+            if ch_url in chapters_by_url:
+                continue  # dedupe: first link wins
+            m = _CH_NUM_RE.search(href)
+            title_ = _chapter_title(el) or href[href.rfind("/") + 1:]
+            chapters_by_url[ch_url] = (float(m.group(1)) if m else float("inf"), Chapter(title_, ch_url))
+            continue
+
+        if el.tag == "div":
+            # Only the description div is read; other divs are skipped without touching their text.
+            if description is None and _is_description(el):
+                description = "".join(el.itertext()).strip()
+            continue
+
+        text = "".join(el.itertext()).strip()
+        if el.tag == "h1":
+            if title is None and "text-2xl" in (el.get("class") or "").split():
+                title = text
+            if first_h1 is None:
+                first_h1 = text
+        elif el.tag == "p" and first_p is None and next(el.iterancestors("a"), None) is None:
+            first_p = text  # a <p> inside a chapter link is its caption, not the description
+        if author is None and not author_next and _AUTHOR_RE.search(text):
+            author_next = True
+
+    # Natural chapter order (2 before 10, 10.5 after 10); unnumbered links keep page order at the end.
+    chapters = [ch for _, ch in sorted(chapters_by_url.values(), key=lambda t: t[0])]
+
+    return {
+        "title": title or first_h1 or "Unknown Title",
+        "author": author,
+        # div.manga-description, falling back to the first <p>
+        "description": description if description is not None else first_p,
+        "chapters": chapters,
+    }
+
+async def scrape_manga(url: str):
     """
     Scrapes manga info and chapter list from Mangapill.
     Returns a dict with:
@@ -35,55 +130,36 @@ def scrape_manga(url: str):
       "title": str,
       "author": str | None,
       "description": str | None,
-      "chapters": [{"title":..., "url":...}, ...]
+      "chapters": [Chapter(title, url), ...]
     }
     """
     if not validate_manga_url(url):
         raise ValueError(f"Invalid Mangapill URL: {url}")
 
-    console.log(f"🌐 Fetching manga page: {url}")
+    # The cache is only an optimization: a Redis problem falls back to a live scrape.
+    cache_key = f"scrape:manga:{url}"
+    try:
+        cached = await _redis.get(cache_key)
+    except Exception as e:
+        log.warning("Scrape cache read failed for %s: %s", url, e)
+        cached = None
+    if cached:
+        manga = orjson.loads(cached)
+        manga["chapters"] = [Chapter(**ch) for ch in manga["chapters"]]
+        return manga
+
+    log.debug("🌐 Fetching manga page: %s", url)
     try:
-        resp = httpx.get(url, headers=HEADERS, timeout=DEFAULT_REQUEST_TIMEOUT)
-        resp.raise_for_status()
+        # Parsed as it downloads; only the tags the lookups above use are reported.
+        manga = await parse_url(url, _PAGE_TAGS, _parse_manga, _keeps_text)
     except Exception as e:
-        console.log(f"[red]Failed to fetch manga page:[/red] {e}")
+        log.warning("Failed to fetch manga page %s: %s", url, e)
         return None
-
-    soup = BeautifulSoup(resp.text, "html.parser")
-
-    # Extract manga title
-    title_tag = soup.find("h1", class_="text-2xl") or soup.find("h1")
-    title = title_tag.text.strip() if title_tag else "Unknown Title"
-
-    # Author
-    author_tag = soup.find(string=re.compile("Author"))
-    author = author_tag.find_next("a").text.strip() if author_tag else None
-
-    # Description
-    desc_tag = soup.find("div", class_="manga-description") or soup.find("p")
-    description = desc_tag.text.strip() if desc_tag else None
-
-    # Chapter list
-    chapters = []
-    for a in soup.select("a[href*='/chapter/']"):
-        href = a.get("href")
-        ch_title = a.text.strip()
-        if not href:
-            continue
-        ch_url = href if href.startswith("http") else BASE_URL + href
-        chapters.append({
-            "title": ch_title or href.split("/")[-1],
-            "url": ch_url,
-        })
-
-    chapters = list({c["url"]: c for c in chapters}.values())  # dedupe
-    chapters.sort(key=lambda x: x["url"])  # ensure order
-
-    console.log(f"✅ Found {len(chapters)} chapters for {title}")
-
-    return {
-        "title": title,
-        "author": author,
-        "description": description,
-        "chapters": chapters,
-    }
+    log.info("✅ Found %d chapters for %s", len(manga["chapters"]), manga["title"])
+    # No chapters usually means an error/anti-bot/truncated page - don't pin it for the TTL.
+    if manga["chapters"]:
+        try:
+            await _redis.setex(cache_key, SCRAPE_CACHE_TTL, orjson.dumps(manga))
+        except Exception as e:
+            log.warning("Scrape cache write failed for %s: %s", url, e)
+    return manga
@@ -0,0 +1,115 @@
+"""
+scrapers/session.py
+Shared async HTTP client for the scrapers: per-host concurrency cap, retries,
+and streaming HTML parsing.
+"""
+
+import asyncio
+import httpx
+from collections import defaultdict
+from contextlib import aclosing, asynccontextmanager
+from lxml import etree
+from urllib.parse import urlsplit
+from constants import HEADERS, DEFAULT_REQUEST_TIMEOUT
+from config import get_config
+
+cfg = get_config()
+
+PER_HOST_LIMIT = 64
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+MAX_RETRY_AFTER = 60
+STREAM_CHUNK_SIZE = 1 << 14
+
+_client = None
+_host_sems = defaultdict(lambda: asyncio.Semaphore(PER_HOST_LIMIT))
+
+# -------------------------------------------------------
+# 🌐 Client lifecycle
+# -------------------------------------------------------
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it on first use (inside the running loop)."""
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            headers=HEADERS,
+            timeout=DEFAULT_REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_connections=64, max_keepalive_connections=32),
+            http2=True,
+        )
+    return _client
+
+async def close_client():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+# -------------------------------------------------------
+# 📡 Fetch
+# -------------------------------------------------------
+
+def _retry_delay(resp: httpx.Response, attempt: int) -> float:
+    """Honour a numeric Retry-After, otherwise back off exponentially."""
+    after = resp.headers.get("retry-after", "")
+    if after.isdigit():
+        return min(int(after), MAX_RETRY_AFTER)
+    return cfg.retry_base_delay * 2 ** attempt
+
+@asynccontextmanager
+async def _open(url: str):
+    """Send GET `url` (body unread) and yield the response, holding the host slot until the body is done."""
+    client = get_client()
+    async with _host_sems[urlsplit(url).netloc]:
+        resp = await client.send(client.build_request("GET", url), stream=True)
+        try:
+            yield resp
+        finally:
+            await resp.aclose()
+
+async def _iter_elements(resp: httpx.Response, tags: tuple, keep_inside):
+    """
+    Feed the response body into an lxml pull parser and yield each completed element
+    in `tags`, so parsing overlaps the download. Yielded elements are cleared once the
+    caller moves on, unless an ancestor matches `keep_inside` (its text is still needed).
+    """
+    parser = etree.HTMLPullParser(events=("end",), tag=tags, encoding=resp.charset_encoding or "utf-8")
+    chunks = resp.aiter_bytes(STREAM_CHUNK_SIZE)
+    while True:
+        chunk = await anext(chunks, None)
+        if chunk is None:
+            parser.close()
+        else:
+            parser.feed(chunk)
+        for _, elem in parser.read_events():
+            yield elem
+            if keep_inside is None or not any(map(keep_inside, elem.iterancestors())):
+                elem.clear(keep_tail=True)
+        if chunk is None:
+            return
+
+async def parse_url(url: str, tags: tuple, parse, keep_inside=None):
+    """
+    Stream `url` and return `await parse(elements)`, where `elements` async-iterates the
+    completed `tags` elements in document order (read what you need before the next one).
+    429/5xx responses and transport errors - including ones partway through the body -
+    are retried RETRY_COUNT times with backoff; each attempt re-runs `parse` from scratch.
+
+    Memory stays bounded only for the target elements that get cleared: the empty
+    shells of non-target ancestors (div, li, ...) and kept subtrees still accumulate.
+    """
+    for attempt in range(cfg.retry_count + 1):
+        last = attempt == cfg.retry_count
+        try:
+            async with _open(url) as resp:
+                if last or resp.status_code not in RETRY_STATUSES:
+                    resp.raise_for_status()
+                    async with aclosing(_iter_elements(resp, tags, keep_inside)) as elements:
+                        return await parse(elements)
+                delay = _retry_delay(resp, attempt)
+        except httpx.TransportError:
+            if last:
+                raise
+            delay = cfg.retry_base_delay * 2 ** attempt
+        # Sleep outside the semaphore so backoff doesn't hold a host slot.
+        await asyncio.sleep(delay)
@@ -1,6 +1,13 @@
+from functools import lru_cache
+from urllib.parse import urlsplit
 from .mangapill_source import MangapillSource
 
-def find_source_for_url(url: str):
-    if "mangapill.com" in url:
+@lru_cache(maxsize=1024)
+def _find_source_for_host(host: str):
+    if "mangapill.com" in host:
         return MangapillSource
     return None
+
+def find_source_for_url(url: str):
+    # Matching only depends on the host, so cache on that (query strings would defeat the cache).
+    return _find_source_for_host(urlsplit(url).netloc.lower())
@@ -5,8 +5,8 @@ class MangapillSource:
     base_url = "https://mangapill.com"
 
     @staticmethod
-    def scrape(url: str):
-        return scrape_manga(url)
+    async def scrape(url: str):
+        return await scrape_manga(url)
 
     @staticmethod
     def validate(url: str):
@@ -0,0 +1,82 @@
+"""
+tests/test_manga_parser.py
+Fixture pages for the streaming manga-page parser, fetched through a mocked transport.
+Run with: python -m unittest discover tests
+"""
+
+import unittest
+import httpx
+from scrapers import session
+from scrapers.manga import _PAGE_TAGS, _keeps_text, _parse_manga
+
+URL = "https://mangapill.com/manga/one-piece"
+
+
+class MangaParserTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncTearDown(self):
+        await session.close_client()
+
+    async def parse(self, body: bytes):
+        page = b"<html><body>" + body + b"</body></html>"
+
+        # Odd-sized chunks so end events land mid-element, as they do on the wire.
+        async def chunks():
+            for i in range(0, len(page), 7):
+                yield page[i:i + 7]
+
+        def handler(request):
+            return httpx.Response(200, content=chunks(), headers={"content-type": "text/html; charset=utf-8"})
+
+        session._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        return await session.parse_url(URL, _PAGE_TAGS, _parse_manga, _keeps_text)
+
+    async def test_block_inside_chapter_link_keeps_title(self):
+        manga = await self.parse(
+            b'<a href="/chapter/one-piece-chapter-2"><div>Chapter <b>2</b></div></a>'
+            b'<a href="/chapter/one-piece-chapter-1"><p>Chapter 1</p></a>'
+            b'<p>A pirate story.</p>'
+        )
+        self.assertEqual([ch.title for ch in manga["chapters"]], ["Chapter 1", "Chapter 2"])
+        self.assertEqual(manga["description"], "A pirate story.")
+
+    async def test_author_link_inside_label_element(self):
+        manga = await self.parse(
+            b'<p>Author: <a href="/author/oda">Oda</a></p>'
+            b'<a href="/chapter/one-piece-chapter-10">Chapter 10</a>'
+        )
+        self.assertEqual(manga["author"], "Oda")
+        self.assertEqual([ch.title for ch in manga["chapters"]], ["Chapter 10"])
+
+    async def test_author_link_after_label(self):
+        manga = await self.parse(
+            b'<div><label>Author</label><a href="/author/oda">Oda</a></div>'
+            b'<a href="/chapter/one-piece-chapter-1">Chapter 1</a>'
+        )
+        self.assertEqual(manga["author"], "Oda")
+
+    async def test_description_div_preferred_over_first_p(self):
+        manga = await self.parse(
+            b'<h1>Site</h1><h1 class="text-2xl font-bold">One Piece</h1>'
+            b'<p>Sidebar</p>'
+            b'<div class="text-sm manga-description"><p>Gol D. Roger</p><p>was <a href="/g">king</a>.</p></div>'
+        )
+        self.assertEqual(manga["title"], "One Piece")
+        self.assertEqual(manga["description"], "Gol D. Rogerwas king.")
+
+    async def test_description_falls_back_to_first_p(self):
+        manga = await self.parse(b"<div>Info</div><p>Just a description.</p>")
+        self.assertEqual(manga["description"], "Just a description.")
+
+    async def test_chapters_in_natural_order_and_deduped(self):
+        manga = await self.parse(
+            b'<a href="/chapter/x-chapter-10">Chapter 10</a>'
+            b'<a href="/chapter/x-chapter-2">Chapter <b>2</b></a>'
+            b'<a href="/chapter/x-chapter-10.5">Chapter 10.5</a>'
+            b'<a href="/chapter/x-chapter-2">dup</a>'
+        )
+        self.assertEqual([ch.title for ch in manga["chapters"]], ["Chapter 2", "Chapter 10", "Chapter 10.5"])
+        self.assertEqual(manga["chapters"][0].url, "https://mangapill.com/chapter/x-chapter-2")
+
+
+if __name__ == "__main__":
+    unittest.main()
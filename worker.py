@@ -1,17 +1,216 @@
+"""
+worker.py
+Consumes download jobs queued by the API: scrapes the manga page, then
+downloads every chapter through AsyncDownloadManager.
+"""
+
+import os
+import signal
+import socket
 import asyncio
+import logging
+import orjson
+from collections import deque
+import uvloop
 import redis.asyncio as aioredis
+from redis.exceptions import WatchError
+from config import get_config
 from downloader.async_manager import AsyncDownloadManager
+from redis_pool import pool
+from scrapers.chapter import scrape_chapter_images
+from scrapers.manga import scrape_manga
+from scrapers.session import close_client
+
+cfg = get_config()
+
+QUEUE_KEY = "download_jobs"
+# Jobs move here while running (reliable queue), one list per worker.
+PROCESSING_KEY = f"download_jobs:processing:{os.getenv('WORKER_ID') or socket.gethostname()}"
+# Chapter pages scraped ahead of the chapter being downloaded.
+CHAPTER_PREFETCH = 4
+# Interrupted jobs are requeued at startup at most this many times, then parked.
+MAX_JOB_CRASHES = 3
+CRASHES_KEY = "download_jobs:crashes"
+DEAD_KEY = "download_jobs:dead"
+
+async def update_job(redis, job_id, **fields):
+    """
+    Merge `fields` into job:{id} atomically (WATCH/MULTI, retried on conflict).
+    A cancelled job keeps its status, so a racing cancel_download always wins.
+    """
+    key = f"job:{job_id}"
+    async with redis.pipeline(transaction=True) as pipe:
+        while True:
+            try:
+                await pipe.watch(key)
+                raw = await pipe.get(key)
+                job = orjson.loads(raw) if raw else {"id": job_id}
+                if job.get("status") == "cancelled":
+                    fields.pop("status", None)
+                job.update(fields)
+                pipe.multi()
+                pipe.set(key, orjson.dumps(job))
+                await pipe.execute()
+                return job
+            except WatchError:
+                continue
+
+async def finish_job(redis, job_id, status):
+    await update_job(redis, job_id, status=status)
+    await redis.smove("jobs:all", "jobs:done", job_id)
+
+async def is_cancelled(redis, job_id):
+    raw = await redis.get(f"job:{job_id}")
+    return bool(raw) and orjson.loads(raw).get("status") == "cancelled"
+
+async def process_job(redis, mgr, job):
+    job_id, url = job["id"], job["url"]
+    status = "failed"
+    pending = deque()  # (chapter, scrape task) in reading order
+    try:
+        if await is_cancelled(redis, job_id):
+            status = "cancelled"  # cancelled while still queued
+            return
+        manga = await scrape_manga(url)
+        if not manga or not manga["chapters"]:
+            print(f"❌ Job {job_id}: could not fetch chapters for {url}")
+            return
+        job = await update_job(
+            redis, job_id,
+            title=manga["title"], total_chapters=len(manga["chapters"]), status="downloading",
+        )
+        if job["status"] == "cancelled":
+            status = "cancelled"  # cancelled during scrape_manga
+            return
+        # Scrape the next CHAPTER_PREFETCH chapter pages while the current one downloads,
+        # so a cancel or a failure never wastes more than that window.
+        chapters = iter(manga["chapters"])
+        def prefetch():
+            if (ch := next(chapters, None)) is not None:
+                pending.append((ch, asyncio.create_task(scrape_chapter_images(ch.url))))
+        for _ in range(CHAPTER_PREFETCH):
+            prefetch()
+        while pending:
+            ch, page = pending.popleft()
+            prefetch()
+            if await is_cancelled(redis, job_id):
+                status = "cancelled"
+                return
+            try:
+                urls = await page
+            except Exception as e:
+                print(f"⚠️ Job {job_id}: skipping {ch.url}: {e}")
+                urls = None
+            if urls:
+                await mgr.download_chapter(manga["title"], ch.title, urls, source_url=url)
+            await redis.incr(f"progress:{job_id}")
+        status = "completed"
+    except asyncio.CancelledError:
+        # Worker shutdown: main() puts the payload back on the queue, so the job is
+        # queued again rather than finished.
+        status = None
+        raise
+    except Exception as e:
+        print(f"❌ Job {job_id} failed: {e}")
+    finally:
+        for _, page in pending:
+            page.cancel()
+        if status is None:
+            await update_job(redis, job_id, status="queued")
+        else:
+            await finish_job(redis, job_id, status)
+
+async def requeue_orphans(redis):
+    """
+    Return jobs a crash left in our processing list to the head of the queue.
+    A job that has already been interrupted MAX_JOB_CRASHES times is parked in
+    DEAD_KEY instead, so a job that kills the worker can't loop forever.
+    """
+    requeued = 0
+    while (raw := await redis.lindex(PROCESSING_KEY, -1)) is not None:
+        if await redis.hincrby(CRASHES_KEY, raw, 1) <= MAX_JOB_CRASHES:
+            await redis.lmove(PROCESSING_KEY, QUEUE_KEY, "RIGHT", "LEFT")
+            requeued += 1
+            continue
+        await redis.lmove(PROCESSING_KEY, DEAD_KEY, "RIGHT", "LEFT")
+        await redis.hdel(CRASHES_KEY, raw)
+        data = orjson.loads(raw)
+        print(f"☠️ Job interrupted {MAX_JOB_CRASHES} times, moved to {DEAD_KEY}: {data.get('id') or data}")
+        if "id" in data:
+            await finish_job(redis, data["id"], "failed")
+    if requeued:
+        print(f"♻️ Requeued {requeued} unfinished job(s) from {PROCESSING_KEY}")
+
+async def next_jobs(redis, n):
+    """Block for one job, then take up to n - 1 more in a single round trip."""
+    first = await redis.blmove(QUEUE_KEY, PROCESSING_KEY, 5, "LEFT", "RIGHT")
+    if first is None:
+        return []
+    pipe = redis.pipeline(transaction=False)
+    for _ in range(n - 1):
+        pipe.lmove(QUEUE_KEY, PROCESSING_KEY, "LEFT", "RIGHT")
+    return [first] + [raw for raw in await pipe.execute() if raw is not None]
+
+async def run_job(redis, mgr, raw):
+    try:
+        data = orjson.loads(raw)
+        if "id" in data:
+            await process_job(redis, mgr, data)
+        else:
+            # Pre-scraped chapter job: download_chapter(**kwargs)
+            await mgr.download_chapter(**data)
+    except Exception as e:
+        print(f"❌ Job failed: {e!r}")
+    # Finished (or failed) jobs leave the processing list right away. Not reached on
+    # cancellation: main() hands those back to the queue on shutdown.
+    pipe = redis.pipeline(transaction=False)
+    pipe.lrem(PROCESSING_KEY, 1, raw)
+    pipe.hdel(CRASHES_KEY, raw)
+    await pipe.execute()
 
 async def main():
-    redis = aioredis.from_url("redis://redis:6379/0", decode_responses=True)
+    redis = aioredis.Redis(connection_pool=pool)
     mgr = AsyncDownloadManager()
-    while True:
-        job = await redis.blpop("download_jobs", timeout=5)
-        if not job:
-            await asyncio.sleep(1)
-            continue
-        data = eval(job[1])
-        await mgr.download_chapter(**data)
+    running = set()
+    slot_free = asyncio.Event()
+
+    def job_done(task):
+        running.discard(task)
+        slot_free.set()
+
+    # `docker stop` sends SIGTERM to PID 1: take the same cancel-and-requeue path as Ctrl-C,
+    # otherwise the next start counts every deploy as a crash.
+    asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+    try:
+        await requeue_orphans(redis)
+        # Up to JOB_BATCH_SIZE jobs run at once; each free slot is refilled as soon as
+        # its job ends, so one long series never holds the others back.
+        while True:
+            if len(running) >= cfg.job_batch_size:
+                slot_free.clear()
+                await slot_free.wait()
+                continue
+            for raw in await next_jobs(redis, cfg.job_batch_size - len(running)):
+                task = asyncio.create_task(run_job(redis, mgr, raw))
+                running.add(task)
+                task.add_done_callback(job_done)
+    finally:
+        for task in running:
+            task.cancel()
+        await asyncio.gather(*running, return_exceptions=True)
+        # A clean shutdown isn't a crash: hand interrupted jobs straight back.
+        while await redis.lmove(PROCESSING_KEY, QUEUE_KEY, "RIGHT", "LEFT"):
+            pass
+        await mgr.close()
+        await close_client()
+        await redis.aclose()
 
 if __name__ == "__main__":
-    asyncio.run(main())
+    logging.basicConfig(
+        level=os.getenv("LOG_LEVEL", "INFO").upper(),
+        format="%(asctime)s %(levelname)s %(name)s: %(message)s",
+    )
+    try:
+        uvloop.run(main())
+    except asyncio.CancelledError:
+        pass  # SIGTERM: main() has already handed its jobs back